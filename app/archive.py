@@ -0,0 +1,168 @@
+import heapq, logging, os, uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from .config import ARCHIVE_DIR, ARCHIVE_BATCH_SIZE, STORAGE_BACKEND
+from .database import execute_sql
+from .memory_store import get_memory_store
+# pyarrow は import が重いため、アーカイブの書き出し・検索時に初めて読み込む
+from .startup_profile import lazy_import
+
+# ルートロガーの設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# タイムゾーン指定の無い検索期間は日本時間とみなす
+JST = timezone(timedelta(hours=9))
+
+# アーカイブから読み出す列 (feed_entries と同じ列名)。feed_type はディレクトリのパーティションに使い、ファイルには書き込まない
+ARCHIVE_COLUMNS = ["id", "feed_id", "feed_type", "entry_id_in_atom", "entry_title", "entry_updated", "publishing_office",
+                   "entry_link", "entry_content", "prefecture", "inserted_at", "fingerprint", "chain_key", "superseded_by"]
+
+def _archive_schema():
+    pa = lazy_import("pyarrow")
+    return pa.schema([
+        ("id", pa.int64()),
+        ("feed_id", pa.int64()),
+        ("entry_id_in_atom", pa.string()),
+        ("entry_title", pa.string()),
+        ("entry_updated", pa.timestamp("us", tz="UTC")),
+        ("publishing_office", pa.string()),
+        ("entry_link", pa.string()),
+        ("entry_content", pa.string()),
+        ("prefecture", pa.string()),
+        ("inserted_at", pa.timestamp("us", tz="UTC")),
+        ("fingerprint", pa.string()),
+        ("chain_key", pa.string()),
+        ("superseded_by", pa.int64()),
+    ])
+
+class ArchiveQueryError(Exception):
+    """アーカイブの読み込みに失敗した場合の例外 (pyarrow の例外を包む)"""
+
+def _partition_schema():
+    pa = lazy_import("pyarrow")
+    return pa.schema([("date", pa.string()), ("feed_type", pa.string())])
+
+def _partitioning():
+    """date=YYYY-MM-DD/feed_type=xxx のディレクトリ構成 (値は文字列として扱う)"""
+    ds = lazy_import("pyarrow.dataset")
+    return ds.partitioning(_partition_schema(), flavor="hive")
+
+def _partition_day(row: Dict) -> str:
+    """更新日時 (無い場合は挿入日時) の UTC での日付"""
+    timestamp = row.get("entry_updated") or row.get("inserted_at")
+    return timestamp.astimezone(timezone.utc).date().isoformat() if timestamp else "unknown"
+
+def write_archive_batch(rows: List[Dict]) -> int:
+    """行を日付・feed_type ごとに分け、zstd 圧縮の Parquet ファイルとして書き出す"""
+    if not rows:
+        return 0
+    pa = lazy_import("pyarrow")
+    pq = lazy_import("pyarrow.parquet")
+    schema = _archive_schema()
+
+    partitions: Dict[tuple, List[Dict]] = {}
+    for row in rows:
+        partitions.setdefault((_partition_day(row), row.get("feed_type") or "unknown"), []).append(row)
+
+    batch_id = uuid.uuid4().hex
+    for (day, feed_type), partition_rows in partitions.items():
+        directory = os.path.join(ARCHIVE_DIR, f"date={day}", f"feed_type={feed_type}")
+        os.makedirs(directory, exist_ok=True)
+        table = pa.Table.from_pylist([{name: row.get(name) for name in schema.names} for row in partition_rows], schema=schema)
+        # 書き込み途中のファイルを検索で読まないよう、"." で始まる一時ファイル (データセットの読み込み対象外) から置き換える
+        tmp_path = os.path.join(directory, f".part-{batch_id}.parquet.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(directory, f"part-{batch_id}.parquet"))
+    return len(rows)
+
+def _fetch_expired_batches(cutoff: datetime) -> Iterable[List[Dict]]:
+    """cutoff より前に挿入されたエントリを id 順に ARCHIVE_BATCH_SIZE 件ずつ返す"""
+    last_id = 0
+    while True:
+        rows = execute_sql(f"""
+            SELECT {", ".join(ARCHIVE_COLUMNS)} FROM feed_entries
+            WHERE inserted_at < %s AND id > %s
+            ORDER BY id LIMIT %s
+        """, (cutoff, last_id, ARCHIVE_BATCH_SIZE), fetchall=True)
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+
+def archive_expired_entries(cutoff: datetime) -> int:
+    """
+    削除対象 (cutoff より前に挿入) のエントリをバッチごとにアーカイブへ書き出し、書き出したバッチを削除する。
+    書き出しに失敗した場合は例外を送出し、そのバッチ以降は削除しない。
+    """
+    archived = 0
+    if STORAGE_BACKEND == "memory":
+        store = get_memory_store()
+        records = store.get_older_than(cutoff)
+        for start in range(0, len(records), ARCHIVE_BATCH_SIZE):
+            batch = records[start:start + ARCHIVE_BATCH_SIZE]
+            archived += write_archive_batch([{column: getattr(record, column) for column in ARCHIVE_COLUMNS} for record in batch])
+            store.delete_entries([record.id for record in batch])
+        return archived
+
+    for rows in _fetch_expired_batches(cutoff):
+        archived += write_archive_batch(rows)
+        execute_sql("DELETE FROM feed_entries WHERE id = ANY(%s)", ([row["id"] for row in rows],))
+        logger.info(f"Archived {archived} entries so far")
+    return archived
+
+def query_archive(prefecture: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  feed_type: Optional[str] = None, limit: int = 1000) -> List[Dict]:
+    """
+    アーカイブから都道府県・期間 (entry_updated) で絞り込み、新しい順に最大 limit 件を返す。
+    タイムゾーン指定の無い start / end は日本時間 (JST) とみなす。
+    日付・feed_type のディレクトリで読み込むファイルを絞り、ファイルはメモリマップで読む。
+    結果全体は読み込まず、レコードバッチごとに走査して上位 limit 件だけを保持する。
+    読み込みに失敗した場合は ArchiveQueryError を送出する。
+    """
+    if not ARCHIVE_DIR or not os.path.isdir(ARCHIVE_DIR):
+        return []
+    pa = lazy_import("pyarrow")
+    ds = lazy_import("pyarrow.dataset")
+    fs = lazy_import("pyarrow.fs")
+
+    conditions = []
+    timestamp_type = pa.timestamp("us", tz="UTC")
+    if start:
+        start = start if start.tzinfo else start.replace(tzinfo=JST)
+        conditions.append(ds.field("date") >= start.astimezone(timezone.utc).date().isoformat())
+        conditions.append(ds.field("entry_updated") >= pa.scalar(start, type=timestamp_type))
+    if end:
+        end = end if end.tzinfo else end.replace(tzinfo=JST)
+        conditions.append(ds.field("date") <= end.astimezone(timezone.utc).date().isoformat())
+        conditions.append(ds.field("entry_updated") < pa.scalar(end, type=timestamp_type))
+    if feed_type:
+        conditions.append(ds.field("feed_type") == feed_type)
+    if prefecture:
+        conditions.append(ds.field("prefecture") == prefecture)
+
+    row_filter = None
+    for condition in conditions:
+        row_filter = condition if row_filter is None else row_filter & condition
+
+    try:
+        # スキーマを明示し、ファイルが無い (初回のアーカイブ前の) 状態でも列を参照できるようにする
+        schema = pa.unify_schemas([_archive_schema(), _partition_schema()])
+        dataset = ds.dataset(ARCHIVE_DIR, format="parquet", partitioning=_partitioning(), schema=schema,
+                             filesystem=fs.LocalFileSystem(use_mmap=True))
+        if not dataset.files:
+            return []
+        columns = [column for column in ARCHIVE_COLUMNS if column not in ("fingerprint", "chain_key")]
+        # (entry_updated, id) が小さいものを先頭に持つ、大きさ limit のヒープ。entry_updated の無い行は最も古い扱い
+        top: List[tuple] = []
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+        for batch in dataset.scanner(columns=columns, filter=row_filter).to_batches():
+            for row in batch.to_pylist():
+                key = (row["entry_updated"] or oldest, row["id"])
+                if len(top) < limit:
+                    heapq.heappush(top, (key, row))
+                elif key > top[0][0]:
+                    heapq.heapreplace(top, (key, row))
+    except pa.ArrowException as e:
+        raise ArchiveQueryError(f"Failed to query archive ({ARCHIVE_DIR}): {e}") from e
+    return [row for _, row in sorted(top, key=lambda item: item[0], reverse=True)]
@@ -1,9 +1,9 @@
 from fastapi import HTTPException, status, Request, Response
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from jose import JWTError, jwt
 from pydantic import BaseModel
 from dotenv import load_dotenv
+from .profiling import phase
 import os
 
 load_dotenv()
@@ -16,6 +16,7 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt  # 起動時間短縮のため初回使用時に読み込む
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -26,6 +27,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def verify_token(token: str) -> TokenData:
+    from jose import JWTError, jwt  # 起動時間短縮のため初回使用時に読み込む
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -45,15 +47,16 @@ def verify_token(token: str) -> TokenData:
     return token_data
 
 async def get_current_user(request: Request):
-    token = request.cookies.get("access_token")
-    if not token:
-        return None  # 未認証の場合は None を返す
+    with phase("auth"):
+        token = request.cookies.get("access_token")
+        if not token:
+            return None  # 未認証の場合は None を返す
 
-    try:
-        user = verify_token(token)
-        return user
-    except HTTPException: #HTTPExceptionをキャッチ
-        return None
+        try:
+            user = verify_token(token)
+            return user
+        except HTTPException: #HTTPExceptionをキャッチ
+            return None
 
 def set_auth_cookie(response: Response, user_data: dict):
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
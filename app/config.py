@@ -21,6 +21,31 @@ LONG_FREQUENCY_INTERVAL = int(PERIODIC_FETCH_INTERVAL * LONG_FREQUENCY_MULTIPLIE
 # ダウンロード制限の閾値（環境変数から取得、デフォルトは80%）
 DOWNLOAD_LIMIT_THRESHOLD = float(os.environ.get("DOWNLOAD_LIMIT_THRESHOLD", "0.8"))
 
+# エントリの保存先 ("postgres" または "memory")。memory は単一インスタンス・ローカル開発・負荷試験向け
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "postgres")
+
+# memory 使用時のスナップショット保存先（未設定の場合は保存しない）
+MEMORY_STORE_SNAPSHOT_PATH = os.environ.get("MEMORY_STORE_SNAPSHOT_PATH")
+
+# DB 接続プールのサイズと、readiness 確認時に接続確立を待つ秒数
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "5"))
+DB_POOL_WARM_UP_TIMEOUT = float(os.environ.get("DB_POOL_WARM_UP_TIMEOUT", "10"))
+
+# 起動直後の初回フィード取得までの待機秒数と、インスタンス間で取得時刻をずらすための最大ゆらぎ（秒）
+INITIAL_FETCH_DELAY = float(os.environ.get("INITIAL_FETCH_DELAY", "10"))
+INITIAL_FETCH_JITTER = float(os.environ.get("INITIAL_FETCH_JITTER", "20"))
+
+# 同じ発表官署・地域で新しい報が前の報を置き換える (発表中の状態全体を表す) 報のタイトル (前方一致)。
+# これらに限り、同じタイトルの報を更新として扱い最新版のみ表示する。
+# 指定河川洪水予報 (河川ごと)、記録的短時間大雨情報、府県気象情報、地震・火山の情報などは
+# タイトルが報の種類を表すだけで、同時に別の事象の報が出るため対象外とする。
+UPDATE_CHAIN_TITLES = ("気象特別警報・警報・注意報", "気象警報・注意報", "土砂災害警戒情報")
+
+# 期限切れエントリのアーカイブ先ディレクトリ（未設定の場合はアーカイブせずに削除する）と、1回に書き出す件数
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR")
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "5000"))
+
 FEED_INFO = {
     "extra": {"url": "https://www.data.jma.go.jp/developer/xml/feed/extra.xml", "category": "警報・注意報", "frequency_type": "高頻度"},
     "eqvol": {"url": "https://www.data.jma.go.jp/developer/xml/feed/eqvol.xml", "category": "地震・火山", "frequency_type": "高頻度"},
@@ -147,3 +172,7 @@ def get_prefecture_from_kishodai(kishodai_name: str) -> list[str]:
         if kishodai_name in offices:
             return offices[kishodai_name]
     return []
+
+def get_base_feed_type(feed_type: str) -> str:
+    """長期フィード (_l) を高頻度フィードと同じ表示用の種別にまとめる"""
+    return feed_type.removesuffix("_l")
@@ -1,41 +1,89 @@
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from dotenv import load_dotenv
-import os, logging
-from datetime import datetime, timedelta # 追加
+import os, logging, threading
+from datetime import datetime, timedelta, timezone # 追加
+from .config import STORAGE_BACKEND, ARCHIVE_DIR, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_WARM_UP_TIMEOUT
+from .memory_store import get_memory_store
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-def get_db_connection():
+def _cloud_sql_params(cloud_sql_connection_name: str) -> dict:
+    """Cloud Run + Cloud SQL用の接続パラメータ (Unixソケット経由で接続)"""
+    db_socket_dir = "/cloudsql"
+    db_host = f"{db_socket_dir}/{cloud_sql_connection_name}"  # Unixソケットを指定
+    return {
+        "host": db_host,
+        "user": os.environ["DB_USER"],
+        "password": os.environ["DB_PASS"],
+        "dbname": os.environ["DB_NAME"],
+    }
+
+def get_connection_params(readonly: bool = False) -> tuple[str, dict]:
+    """接続先を (conninfo, キーワード引数) の形で返す"""
+    # 読み取り専用の接続先 (リードレプリカ・別インスタンス) が設定されている場合はそちらを使用
+    if readonly:
+        database_read_url = os.environ.get("DATABASE_READ_URL")
+        if database_read_url:
+            return database_read_url, {}
+        cloud_sql_read_connection_name = os.environ.get("CLOUD_SQL_READ_CONNECTION_NAME")
+        if cloud_sql_read_connection_name:
+            return "", _cloud_sql_params(cloud_sql_read_connection_name)
+
     # 環境変数 DATABASE_URL が設定されている場合 (ローカル開発時) はそれを使用
     database_url = os.environ.get("DATABASE_URL")
     if database_url:
-        conn = psycopg.connect(database_url)
-        return conn
+        return database_url, {}
 
     # Cloud Run + Cloud SQL用
-    cloud_sql_connection_name = os.environ["CLOUD_SQL_CONNECTION_NAME"]
-    db_socket_dir = "/cloudsql"
-    db_host = f"{db_socket_dir}/{cloud_sql_connection_name}"  # Unixソケットを指定
-    db_user = os.environ["DB_USER"]
-    db_pass = os.environ["DB_PASS"]
-    db_name = os.environ["DB_NAME"]
+    return "", _cloud_sql_params(os.environ["CLOUD_SQL_CONNECTION_NAME"])
+
+def get_db_connection(readonly: bool = False):
+    conninfo, kwargs = get_connection_params(readonly)
+    return psycopg.connect(conninfo, **kwargs)
+
+# 書き込み用・読み取り用それぞれの接続プール (初回使用時に作成)
+_connection_pools: dict[bool, ConnectionPool] = {}
+# /ready (スレッド) と通常のリクエストが同時にプールを作成しないよう保護する
+_connection_pools_lock = threading.Lock()
+
+def get_connection_pool(readonly: bool = False) -> ConnectionPool:
+    pool = _connection_pools.get(readonly)
+    if pool is None:
+        with _connection_pools_lock:
+            pool = _connection_pools.get(readonly)
+            if pool is None:
+                conninfo, kwargs = get_connection_params(readonly)
+                pool = ConnectionPool(conninfo, kwargs=kwargs, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE, open=True)
+                _connection_pools[readonly] = pool
+    return pool
+
+def warm_up_connection_pools():
+    """接続プールを開き、最低限の接続が確立されるまで待つ (readiness 確認用)"""
+    for readonly in (False, True):
+        get_connection_pool(readonly).wait(timeout=DB_POOL_WARM_UP_TIMEOUT)
+
+def close_connection_pools():
+    with _connection_pools_lock:
+        for pool in _connection_pools.values():
+            pool.close()
+        _connection_pools.clear()
 
-    conn = psycopg.connect(
-        host=db_host,
-        user=db_user,
-        password=db_pass,
-        dbname=db_name
-    )
-    return conn
-    
-def execute_sql(sql: str, params=None, fetchone=False, fetchall=False):
+def execute_sql(sql: str, params=None, fetchone=False, fetchall=False, readonly=False):
+    """
+    SQLを実行する。
+    readonly=True の場合は読み取り用の接続先 (リードレプリカ等) に READ ONLY トランザクションで発行する。
+    """
     conn = None  # 初期化
     try:
-        conn = get_db_connection()
+        pool = get_connection_pool(readonly)
+        conn = pool.getconn()
+        if readonly:
+            conn.read_only = True
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(sql, params)
             if fetchone:
@@ -61,7 +109,7 @@ def execute_sql(sql: str, params=None, fetchone=False, fetchall=False):
         raise
     finally:
         if conn:
-            conn.close()
+            pool.putconn(conn)
 
 def init_db():
     """db.sqlを実行してテーブルを初期化する"""
@@ -74,10 +122,18 @@ def init_db():
         print(f"Error initializing database: {e}")
 
 def delete_old_entries(days: int = 7): # 追加
-    """指定された日数以上前のエントリを削除する"""
+    """指定された日数以上前のエントリを削除する (ARCHIVE_DIR 設定時は削除前にアーカイブへ書き出す)"""
     try:
-        cutoff_date = datetime.now() - timedelta(days=days)
-        execute_sql("DELETE FROM feed_entries WHERE inserted_at < %s", (cutoff_date,))
+        cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
+        if ARCHIVE_DIR:
+            # 書き出したバッチごとに削除されるため、ここでの削除は不要
+            from .archive import archive_expired_entries  # archive が本モジュールを import するため遅延読み込み
+            archived = archive_expired_entries(cutoff_date)
+            print(f"{archived}件のエントリをアーカイブしました。")
+        elif STORAGE_BACKEND == "memory":
+            get_memory_store().delete_older_than(cutoff_date)
+        else:
+            execute_sql("DELETE FROM feed_entries WHERE inserted_at < %s", (cutoff_date,))
         print(f"{days}日以上前のエントリを削除しました。")
     except Exception as e:
         print(f"Error deleting old entries: {e}")
@@ -0,0 +1,25 @@
+import hashlib
+from typing import Optional
+from .config import UPDATE_CHAIN_TITLES
+
+# 各項目の区切り (本文中に現れない制御文字)
+_SEPARATOR = "\x1f"
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def entry_fingerprint(title: Optional[str], publishing_office: Optional[str], prefecture: Optional[str], content: Optional[str]) -> str:
+    """
+    タイトル・発表官署・地域・本文のハッシュからエントリの指紋を作る。
+    高頻度・長期フィードの両方に載った報や、内容の変わらない再発表は同じ指紋になる。
+    """
+    return _sha256(_SEPARATOR.join([title or "", publishing_office or "", prefecture or "", _sha256(content or "")]))
+
+def update_chain_key(feed_type: str, title: Optional[str], publishing_office: Optional[str], prefecture: Optional[str]) -> Optional[str]:
+    """
+    同じ報の更新をまとめるキー (feed_type・タイトル・発表官署・地域)。
+    タイトルが UPDATE_CHAIN_TITLES のいずれでも始まらない報は更新としてまとめないため None を返す。
+    """
+    if not title or not title.startswith(UPDATE_CHAIN_TITLES):
+        return None
+    return _sha256(_SEPARATOR.join([feed_type, title or "", publishing_office or "", prefecture or ""]))
@@ -0,0 +1,93 @@
+"""
+トップページ (/) に対する負荷生成スクリプト。
+実際の利用に近い絞り込み条件の組み合わせでリクエストを送り、レイテンシと Server-Timing のフェーズ別集計を表示する。
+
+使い方 (サーバー側は PROFILING_ENABLED=1 で起動しておく):
+    python -m app.loadgen --base-url http://localhost:8000 --duration 60 --concurrency 8 --profile-rate 0.05
+"""
+import argparse, random, re, statistics, threading, time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from .config import REGIONS_DATA
+
+# 絞り込み条件の出現比率 (条件なし・地域のみ・都道府県まで指定)
+FILTER_WEIGHTS = {"none": 0.3, "region": 0.3, "prefecture": 0.4}
+# データの種類の出現比率
+FEED_TYPE_WEIGHTS = {"extra": 0.6, "eqvol": 0.25, "other": 0.15}
+
+SERVER_TIMING_PATTERN = re.compile(r"([\w-]+);dur=([\d.]+)")
+
+def random_params() -> dict:
+    params = {"feed_type": random.choices(list(FEED_TYPE_WEIGHTS), weights=list(FEED_TYPE_WEIGHTS.values()))[0]}
+    kind = random.choices(list(FILTER_WEIGHTS), weights=list(FILTER_WEIGHTS.values()))[0]
+    if kind != "none":
+        region = random.choice(list(REGIONS_DATA))
+        params["region"] = region
+        if kind == "prefecture":
+            params["prefecture"] = random.choice(REGIONS_DATA[region]["prefectures"])
+    return params
+
+def login(base_url: str) -> str:
+    """/start でログインし、access_token Cookie の値を返す (Secure 属性付きのため http でも送れるよう手動で扱う)"""
+    response = requests.get(f"{base_url}/start", allow_redirects=False, timeout=10)
+    response.raise_for_status()
+    token = response.cookies.get("access_token")
+    if not token:
+        raise RuntimeError("access_token cookie was not set by /start")
+    return token
+
+def worker(base_url: str, token: str, deadline: float, profile_rate: float, results: dict, lock: threading.Lock):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        headers = {"Cookie": f"access_token={token}"}
+        if random.random() < profile_rate:
+            headers["X-Profile"] = "1"
+        start = time.perf_counter()
+        try:
+            response = session.get(f"{base_url}/", params=random_params(), headers=headers, timeout=30)
+            ok = response.status_code == 200
+            server_timing = response.headers.get("Server-Timing", "")
+        except requests.exceptions.RequestException:
+            ok = False
+            server_timing = ""
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            results["latencies"].append(elapsed)
+            if not ok:
+                results["errors"] += 1
+            for name, duration in SERVER_TIMING_PATTERN.findall(server_timing):
+                results["phases"][name].append(float(duration))
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the top page")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=30, help="実行時間 (秒)")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時に送るリクエスト数")
+    parser.add_argument("--profile-rate", type=float, default=0.0, help="X-Profile: 1 を付ける割合 (0.0〜1.0)")
+    args = parser.parse_args()
+
+    token = login(args.base_url)
+    results = {"latencies": [], "errors": 0, "phases": defaultdict(list)}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(worker, args.base_url, token, deadline, args.profile_rate, results, lock)
+
+    latencies = results["latencies"]
+    if not latencies:
+        print("No requests were completed.")
+        return
+    print(f"requests: {len(latencies)}, errors: {results['errors']}, throughput: {len(latencies) / args.duration:.1f} req/s")
+    print(f"latency ms: p50={percentile(latencies, 0.5):.1f} p90={percentile(latencies, 0.9):.1f} "
+          f"p99={percentile(latencies, 0.99):.1f} max={max(latencies):.1f}")
+    for name, durations in sorted(results["phases"].items()):
+        print(f"  {name}: n={len(durations)} mean={statistics.mean(durations):.2f} ms p90={percentile(durations, 0.9):.2f} ms")
+
+if __name__ == "__main__":
+    main()
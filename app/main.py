@@ -1,14 +1,17 @@
+from . import startup_profile  # 起動時間の計測基準とするため最初に読み込む
 from fastapi import FastAPI, Depends, Response, Request, BackgroundTasks, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from typing import Optional
-import asyncio
+from datetime import datetime
+import asyncio, random
 from contextlib import asynccontextmanager
 from .auth import get_current_user, set_auth_cookie, remove_auth_cookie, TokenData
-from . import rss_reader
-from .database import delete_old_entries
-from .config import REGIONS_DATA, FEED_INFO, PERIODIC_FETCH_INTERVAL
+from . import rss_reader, search, profiling, archive
+from .database import delete_old_entries, warm_up_connection_pools, close_connection_pools
+from .memory_store import get_memory_store, save_memory_store_snapshot
+from .config import REGIONS_DATA, FEED_INFO, PERIODIC_FETCH_INTERVAL, STORAGE_BACKEND, INITIAL_FETCH_DELAY, INITIAL_FETCH_JITTER, get_base_feed_type
 import logging
 
 # ルートロガーの設定
@@ -20,14 +23,26 @@ template_directory = "app/templates"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    task = asyncio.create_task(periodic_fetch())
+    startup_profile.mark("lifespan_started")
+    # 起動直後は最初のリクエストの処理を優先し、初回の取得はずらして開始する
+    initial_delay = INITIAL_FETCH_DELAY + random.uniform(0, INITIAL_FETCH_JITTER)
+    task = asyncio.create_task(periodic_fetch(initial_delay))
     yield
     task.cancel()
+    if STORAGE_BACKEND == "memory":
+        await asyncio.to_thread(save_memory_store_snapshot)
+    else:
+        close_connection_pools()
 
 app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory=app_mount_path), name="static")
 templates = Jinja2Templates(directory=template_directory)
+startup_profile.mark("app_created")
+
+# PROFILING_ENABLED=1 の場合のみ、リクエスト単位のプロファイリングを有効にする
+if profiling.PROFILING_ENABLED:
+    app.middleware("http")(profiling.profile_request)
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request,
@@ -40,9 +55,10 @@ async def root(request: Request,
     ログイン状態に応じて、認証開始ボタンまたは項目表示ページへのリンクを表示。
     """
     # Cookieからの取得処理（後でクエリパラメータが優先されるようにする）
-    selected_region = request.cookies.get("selected_region")
-    selected_prefecture = request.cookies.get("selected_prefecture")
-    selected_feed_type = request.cookies.get("selected_feed_type") or "extra"
+    with profiling.phase("cookies"):
+        selected_region = request.cookies.get("selected_region")
+        selected_prefecture = request.cookies.get("selected_prefecture")
+        selected_feed_type = request.cookies.get("selected_feed_type") or "extra"
 
     # クエリパラメータを優先
     context_region = region if region is not None else selected_region
@@ -50,31 +66,22 @@ async def root(request: Request,
     context_feed_type = feed_type if feed_type is not None else selected_feed_type
 
     # データベースからデータを取得 (選択された feed_type, region, prefecture に基づいてフィルタリング)
+    error_message = None
     if context_feed_type not in FEED_INFO:
         # 不正な feed_type が指定された場合は、空のリストを渡す
         entries = []
         feed_title = ""
     else:
-        # feed_type に対応する高頻度・低頻度両方のURLを取得
-        feed_urls = [
-            FEED_INFO[context_feed_type]["url"],
-            FEED_INFO[context_feed_type + "_l"]["url"]
-        ] if context_feed_type + "_l" in FEED_INFO else [FEED_INFO[context_feed_type]["url"]]
-
-        entries = []
+        # 高頻度・長期フィードは読み取りモデル上で同じ feed_type にまとめられており、entry_updated の降順で取得される
         try:
-            for url in feed_urls:
-                entries.extend(rss_reader.get_filtered_entries_from_db(
-                    url, context_region, context_prefecture
-                ))
+            with profiling.phase("db"):
+                entries = rss_reader.get_filtered_entries_from_db(
+                    get_base_feed_type(context_feed_type), context_region, context_prefecture
+                )
         except Exception as e:
             logger.exception(f"Error getting entries from database: {e}")
             entries = []  # エラーが発生した場合は空のリストにする
-            feed_title = ""
-            context["error_message"] = "データの取得中にエラーが発生しました。" # エラーメッセージ
-
-        # entry_updated でソート (降順)
-        entries.sort(key=lambda x: x['entry_updated'], reverse=True)
+            error_message = "データの取得中にエラーが発生しました。" # エラーメッセージ
 
         feed_title = FEED_INFO[context_feed_type]["category"]
 
@@ -88,8 +95,13 @@ async def root(request: Request,
         "username": current_user.username if current_user else None,
         "entries": entries,
         "feed_title": feed_title,
+        "error_message": error_message,
     }
-    return templates.TemplateResponse("index.html", context)
+    with profiling.phase("render"):
+        response = templates.TemplateResponse("index.html", context)
+    # 起動後に最初のページを返せるまでの時間 (/ready などの監視リクエストは含めない)
+    startup_profile.mark("first_request")
+    return response
 
 @app.get("/start")
 async def start(response: Response):
@@ -117,10 +129,56 @@ async def get_prefectures(region: str = Query(...)) -> list[str]:
     """
     return REGIONS_DATA.get(region, {}).get("prefectures", [])
 
-async def periodic_fetch():
+@app.get("/search")
+async def search_entries(q: str = Query(..., min_length=1, max_length=100),
+                         feed_type: Optional[str] = Query(None),
+                         region: Optional[str] = Query(None),
+                         prefecture: Optional[str] = Query(None),
+                         cursor: Optional[str] = Query(None),
+                         limit: int = Query(10, ge=1, le=search.MAX_SEARCH_LIMIT)):
+    """
+    タイトル・本文のキーワード検索。タイトル一致を優先し、新しい順に返す。
+    next_cursor を cursor に指定すると続きを取得できる。
+    """
+    if feed_type is not None and feed_type not in FEED_INFO:
+        return JSONResponse({"detail": "Invalid feed_type"}, status_code=400)
+    try:
+        entries, next_cursor = search.search_entries(
+            q, get_base_feed_type(feed_type) if feed_type else None, region, prefecture, cursor, limit
+        )
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Invalid search cursor: {e}")
+        return JSONResponse({"detail": "Invalid cursor"}, status_code=400)
+    return {"entries": entries, "next_cursor": next_cursor}
+
+@app.get("/archive")
+async def query_archive(prefecture: Optional[str] = Query(None),
+                        start: Optional[datetime] = Query(None),
+                        end: Optional[datetime] = Query(None),
+                        feed_type: Optional[str] = Query(None),
+                        limit: int = Query(100, ge=1, le=1000)):
+    """
+    アーカイブ済み (保持期間を過ぎた) エントリを都道府県・期間で検索する。
+    start 以上 end 未満の entry_updated を対象とし、新しい順に返す (タイムゾーン指定の無い日時は日本時間とみなす)。
+    """
+    if feed_type is not None and feed_type not in FEED_INFO:
+        return JSONResponse({"detail": "Invalid feed_type"}, status_code=400)
+    try:
+        entries = await asyncio.to_thread(
+            archive.query_archive, prefecture, start, end, get_base_feed_type(feed_type) if feed_type else None, limit
+        )
+    except archive.ArchiveQueryError as e:
+        logger.exception(f"Error querying archive: {e}")
+        return {"entries": [], "error_message": "アーカイブの読み込み中にエラーが発生しました。"}
+    return {"entries": entries}
+
+async def periodic_fetch(initial_delay: float = 0):
     """
     定期的にフィードを取得・更新する関数。
+    initial_delay 秒待ってから最初の取得を開始する。
     """
+    logger.info(f"periodic_fetch will start in {initial_delay:.1f} seconds")
+    await asyncio.sleep(initial_delay)
     while True:
         logger.info("periodic_fetch started - outer loop")
         for feed_type, info in FEED_INFO.items():
@@ -139,9 +197,36 @@ async def periodic_fetch():
                 logger.info(f"fetch_and_store_feed_data succeeded for {feed_type}")
             else:
                 logger.info(f"fetch_and_store_feed_data failed for {feed_type}")
+        if STORAGE_BACKEND == "memory":
+            # 再起動時にすぐ表示できるよう、取得サイクルごとにスナップショットを保存する (保存中もリクエストを処理できるよう別スレッドで)
+            await asyncio.to_thread(save_memory_store_snapshot)
         await asyncio.sleep(PERIODIC_FETCH_INTERVAL)
         logger.info(f"periodic_fetch sleeping for {PERIODIC_FETCH_INTERVAL} seconds")  # ログ追加
 
+def warm_up():
+    """テンプレートのコンパイルと保存先への接続確立を済ませておく"""
+    templates.get_template("index.html")
+    if STORAGE_BACKEND == "memory":
+        get_memory_store()
+    else:
+        warm_up_connection_pools()
+
+@app.get("/ready")
+async def ready():
+    """
+    readiness / warm-up 用のエンドポイント。
+    Cloud Run の起動プローブから呼び出し、準備が整ったら起動プロファイルを返す。
+    """
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        logger.exception(f"Warm-up failed: {e}")
+        return JSONResponse({"status": "not ready"}, status_code=503)
+    startup_profile.mark("ready")
+    profile = startup_profile.get_startup_profile()
+    logger.info(f"Startup profile: {profile}")
+    return {"status": "ready", "startup_profile": profile}
+
 @app.get("/delete_old_entries")
 async def delete_old_entries_endpoint(background_tasks: BackgroundTasks):
     background_tasks.add_task(delete_old_entries, days=7)
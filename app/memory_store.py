@@ -0,0 +1,310 @@
+import bisect, heapq, itertools, logging, os, pickle, threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from .config import MEMORY_STORE_SNAPSHOT_PATH
+
+# ルートロガーの設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# entry_updated が無いエントリは最も古いものとして扱う
+_MIN_TIMESTAMP = float("-inf")
+
+class EntryRecord:
+    """feed_entries の1行に相当するレコード (__slots__ でメモリ使用量を抑える)"""
+    __slots__ = ("id", "feed_id", "feed_type", "entry_id_in_atom", "entry_title", "entry_updated",
+                 "publishing_office", "entry_link", "entry_content", "prefecture", "inserted_at",
+                 "fingerprint", "chain_key", "superseded_by", "sort_key")
+
+    def __init__(self, id: int, feed_id: int, feed_type: str, entry_id_in_atom: Optional[str], entry_title: Optional[str],
+                 entry_updated: Optional[datetime], publishing_office: Optional[str], entry_link: Optional[str],
+                 entry_content: Optional[str], prefecture: Optional[str], inserted_at: datetime,
+                 fingerprint: Optional[str] = None, chain_key: Optional[str] = None):
+        self.id = id
+        self.feed_id = feed_id
+        self.feed_type = feed_type
+        self.entry_id_in_atom = entry_id_in_atom
+        self.entry_title = entry_title
+        self.entry_updated = entry_updated
+        self.publishing_office = publishing_office
+        self.entry_link = entry_link
+        self.entry_content = entry_content
+        self.prefecture = prefecture
+        self.inserted_at = inserted_at
+        self.fingerprint = fingerprint
+        self.chain_key = chain_key
+        self.superseded_by: Optional[int] = None
+        # (更新日時, id) の昇順で索引に並べる。id を含めることでキーを一意にする
+        self.sort_key = (entry_updated.timestamp() if entry_updated else _MIN_TIMESTAMP, id)
+
+    def to_dict(self) -> Dict:
+        """読み取りモデル (feed_entries_read) と同じ列名の辞書に変換する"""
+        return {
+            "entry_title": self.entry_title,
+            "entry_updated": self.entry_updated,
+            "publishing_office": self.publishing_office,
+            "entry_link": self.entry_link,
+            "entry_content": self.entry_content,
+            "prefecture": self.prefecture,
+        }
+
+class _SortedIndex:
+    """sort_key の昇順に並べたレコードの索引。新しい順に取り出す"""
+    __slots__ = ("keys", "records")
+
+    def __init__(self):
+        self.keys: List[Tuple[float, int]] = []
+        self.records: List[EntryRecord] = []
+
+    def add(self, record: EntryRecord):
+        i = bisect.bisect_left(self.keys, record.sort_key)
+        self.keys.insert(i, record.sort_key)
+        self.records.insert(i, record)
+
+    def remove(self, record: EntryRecord):
+        i = bisect.bisect_left(self.keys, record.sort_key)
+        if i < len(self.keys) and self.records[i] is record:
+            del self.keys[i]
+            del self.records[i]
+
+    def newest(self):
+        return reversed(self.records)
+
+class MemoryEntryStore:
+    """
+    直近のエントリをメモリ上に保持するストア。
+    feed_type ごと、(feed_type, 都道府県) ごとの索引を持ち、DB と同じ条件での取得に答える。
+    """
+
+    def __init__(self):
+        # BackgroundTasks (スレッドプール) からの削除と並行するためロックで保護する
+        self._lock = threading.Lock()
+        self.feed_meta: Dict[str, Dict] = {}
+        self.entries: Dict[int, EntryRecord] = {}
+        self._unique_keys: set = set()
+        # 表示対象 (superseded_by が None) のレコードの (feed_type, 指紋)。置き換えられた版とは重複判定しない
+        self._fingerprints: set = set()
+        # chain_key ごとの最新版 (表示対象) と、同じ chain_key を持つ全レコード
+        self._chain_latest: Dict[str, EntryRecord] = {}
+        self._chain_members: Dict[str, List[EntryRecord]] = {}
+        self._by_feed: Dict[str, _SortedIndex] = {}
+        self._by_feed_prefecture: Dict[Tuple[str, Optional[str]], _SortedIndex] = {}
+        self._next_feed_id = 1
+        self._next_entry_id = 1
+
+    def get_last_fetched(self, feed_url: str) -> Optional[datetime]:
+        meta = self.feed_meta.get(feed_url)
+        return meta["last_fetched"] if meta else None
+
+    def upsert_feed_meta(self, feed_url: str, **fields) -> int:
+        """feed_meta の INSERT ... ON CONFLICT (feed_url) DO UPDATE に相当"""
+        with self._lock:
+            meta = self.feed_meta.get(feed_url)
+            if meta is None:
+                meta = {"id": self._next_feed_id, "feed_url": feed_url}
+                self._next_feed_id += 1
+                self.feed_meta[feed_url] = meta
+            meta.update(fields)
+            return meta["id"]
+
+    def insert_entry(self, feed_id: int, feed_type: str, entry_id_in_atom: Optional[str], entry_title: Optional[str],
+                     entry_updated: Optional[datetime], publishing_office: Optional[str], entry_link: Optional[str],
+                     entry_content: Optional[str], prefecture: Optional[str],
+                     fingerprint: Optional[str] = None, chain_key: Optional[str] = None) -> Optional[int]:
+        """
+        feed_entries への INSERT ... ON CONFLICT DO NOTHING に相当。挿入しなかった場合は None を返す。
+        指紋の重複は表示対象の版とだけ判定する (発表→解除→再発表のように過去の版と同じ内容の報は挿入する)。
+        同じ chain_key の報は最新版だけを索引に残し、古い版は superseded_by で最新版に紐付ける。
+        """
+        unique_key = (feed_id, entry_id_in_atom, publishing_office)
+        with self._lock:
+            if unique_key in self._unique_keys or (fingerprint and (feed_type, fingerprint) in self._fingerprints):
+                return None
+            record = EntryRecord(self._next_entry_id, feed_id, feed_type, entry_id_in_atom, entry_title, entry_updated,
+                                 publishing_office, entry_link, entry_content, prefecture, datetime.now(timezone.utc),
+                                 fingerprint, chain_key)
+            self._next_entry_id += 1
+            self._add(record)
+            return record.id
+
+    def _add(self, record: EntryRecord):
+        self.entries[record.id] = record
+        self._unique_keys.add((record.feed_id, record.entry_id_in_atom, record.publishing_office))
+
+        if record.chain_key:
+            members = self._chain_members.setdefault(record.chain_key, [])
+            members.append(record)
+            latest = self._chain_latest.get(record.chain_key)
+            if latest is not None and latest.sort_key > record.sort_key:
+                # 既に新しい版があるため表示対象にしない
+                record.superseded_by = latest.id
+                return
+            if latest is not None:
+                self._unindex(latest)
+                self._fingerprints.discard((latest.feed_type, latest.fingerprint))
+                for other in members:
+                    if other is not record:
+                        other.superseded_by = record.id
+            self._chain_latest[record.chain_key] = record
+        if record.fingerprint:
+            self._fingerprints.add((record.feed_type, record.fingerprint))
+        self._index(record)
+
+    def _index(self, record: EntryRecord):
+        self._by_feed.setdefault(record.feed_type, _SortedIndex()).add(record)
+        self._by_feed_prefecture.setdefault((record.feed_type, record.prefecture), _SortedIndex()).add(record)
+
+    def _unindex(self, record: EntryRecord):
+        self._by_feed[record.feed_type].remove(record)
+        self._by_feed_prefecture[(record.feed_type, record.prefecture)].remove(record)
+
+    def _remove(self, record: EntryRecord):
+        del self.entries[record.id]
+        self._unique_keys.discard((record.feed_id, record.entry_id_in_atom, record.publishing_office))
+        if record.chain_key:
+            members = self._chain_members[record.chain_key]
+            members.remove(record)
+            if not members:
+                del self._chain_members[record.chain_key]
+        if record.superseded_by is None:
+            self._unindex(record)
+            self._fingerprints.discard((record.feed_type, record.fingerprint))
+            if record.chain_key and self._chain_latest.get(record.chain_key) is record:
+                del self._chain_latest[record.chain_key]
+
+    def get_filtered_entries(self, feed_type: str, prefectures: Optional[List[str]] = None, limit: int = 10) -> List[Dict]:
+        """
+        feed_type の新しい順に最大 limit 件を返す。
+        prefectures を指定した場合はそれらの都道府県の索引をマージして返す。
+        """
+        with self._lock:
+            if prefectures is None:
+                index = self._by_feed.get(feed_type)
+                records = index.newest() if index else iter(())
+            else:
+                indexes = [self._by_feed_prefecture.get((feed_type, pref)) for pref in prefectures]
+                records = heapq.merge(*(index.newest() for index in indexes if index),
+                                      key=lambda r: r.sort_key, reverse=True)
+            return [record.to_dict() for record in itertools.islice(records, limit)]
+
+    def search(self, normalized_query: str, feed_type: Optional[str] = None, prefectures: Optional[List[str]] = None,
+               after: Optional[Tuple[int, Optional[datetime], int]] = None, limit: int = 10) -> List[Dict]:
+        """
+        タイトル・本文に検索語を含むエントリを (順位, 更新日時, id) の降順で返す。
+        DB のような n-gram 索引は持たず全件を走査する (保持件数が少ない単一インスタンス・開発用途のため)。
+        """
+        from .search import normalize_search_text  # search が本モジュールを import するため遅延読み込み
+        prefecture_set = set(prefectures) if prefectures is not None else None
+        after_key = None
+        if after:
+            rank, entry_updated, source_id = after
+            after_key = (rank, (entry_updated.timestamp() if entry_updated else _MIN_TIMESTAMP, source_id))
+
+        hits = []
+        with self._lock:
+            for record in self.entries.values():
+                if record.superseded_by is not None:
+                    continue
+                if feed_type and record.feed_type != feed_type:
+                    continue
+                if prefecture_set is not None and record.prefecture not in prefecture_set:
+                    continue
+                if normalized_query in normalize_search_text(record.entry_title):
+                    rank = 2
+                elif normalized_query in normalize_search_text(record.entry_content):
+                    rank = 1
+                else:
+                    continue
+                key = (rank, record.sort_key)
+                if after_key is None or key < after_key:
+                    hits.append((key, record))
+
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        results = []
+        for (rank, _), record in hits[:limit]:
+            row = record.to_dict()
+            row.update(source_id=record.id, feed_type=record.feed_type, rank=rank)
+            results.append(row)
+        return results
+
+    def get_older_than(self, cutoff: datetime) -> List[EntryRecord]:
+        """inserted_at が cutoff より前のエントリを id 順に返す (アーカイブへの書き出し用)"""
+        with self._lock:
+            return sorted((record for record in self.entries.values() if record.inserted_at < cutoff), key=lambda r: r.id)
+
+    def delete_entries(self, entry_ids: List[int]) -> int:
+        """指定した id のエントリを削除し、削除件数を返す (アーカイブへ書き出したバッチの削除用)"""
+        with self._lock:
+            records = [self.entries[entry_id] for entry_id in entry_ids if entry_id in self.entries]
+            for record in records:
+                self._remove(record)
+            return len(records)
+
+    def delete_older_than(self, cutoff: datetime) -> int:
+        """inserted_at が cutoff より前のエントリを削除し、削除件数を返す"""
+        with self._lock:
+            expired = [record for record in self.entries.values() if record.inserted_at < cutoff]
+            for record in expired:
+                self._remove(record)
+            return len(expired)
+
+    def __getstate__(self):
+        # 索引は復元時に組み直せるため、スナップショットにはレコードのみを含める
+        with self._lock:
+            return {
+                "feed_meta": {url: dict(meta) for url, meta in self.feed_meta.items()},
+                "entries": list(self.entries.values()),
+                "next_feed_id": self._next_feed_id,
+                "next_entry_id": self._next_entry_id,
+            }
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.feed_meta = state["feed_meta"]
+        self._next_feed_id = state["next_feed_id"]
+        self._next_entry_id = state["next_entry_id"]
+        # 古い順に追加し直すことで、更新の紐付けと索引を組み直す
+        for record in sorted(state["entries"], key=lambda r: r.sort_key):
+            record.superseded_by = None
+            self._add(record)
+
+    def save_snapshot(self, path: str):
+        """ストアの内容をファイルに保存する (書き込み途中のファイルを読まないよう、一時ファイルから置き換える)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_snapshot(cls, path: str) -> "MemoryEntryStore":
+        with open(path, "rb") as f:
+            store = pickle.load(f)
+        if not isinstance(store, cls):
+            raise TypeError(f"Unexpected snapshot content: {type(store)}")
+        return store
+
+_store: Optional[MemoryEntryStore] = None
+
+def get_memory_store() -> MemoryEntryStore:
+    """プロセス内で共有するストアを返す。スナップショットがあればそこから復元する"""
+    global _store
+    if _store is None:
+        store = None
+        if MEMORY_STORE_SNAPSHOT_PATH and os.path.exists(MEMORY_STORE_SNAPSHOT_PATH):
+            try:
+                store = MemoryEntryStore.load_snapshot(MEMORY_STORE_SNAPSHOT_PATH)
+                logger.info(f"Loaded memory store snapshot: {len(store.entries)} entries from {MEMORY_STORE_SNAPSHOT_PATH}")
+            except Exception as e:
+                logger.exception(f"Error loading memory store snapshot ({MEMORY_STORE_SNAPSHOT_PATH}): {e}")
+        _store = store or MemoryEntryStore()
+    return _store
+
+def save_memory_store_snapshot():
+    """スナップショットの保存先が設定されていれば、現在のストアを保存する"""
+    if not MEMORY_STORE_SNAPSHOT_PATH or _store is None:
+        return
+    try:
+        _store.save_snapshot(MEMORY_STORE_SNAPSHOT_PATH)
+        logger.info(f"Saved memory store snapshot: {len(_store.entries)} entries to {MEMORY_STORE_SNAPSHOT_PATH}")
+    except Exception as e:
+        logger.exception(f"Error saving memory store snapshot ({MEMORY_STORE_SNAPSHOT_PATH}): {e}")
@@ -0,0 +1,139 @@
+import cProfile, logging, os, random, threading, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+from fastapi import Request
+from .startup_profile import lazy_import
+
+# ルートロガーの設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# プロファイリングを有効にするか (無効の場合はミドルウェア自体を登録しない)
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+# ヘッダー指定が無いリクエストをプロファイルする割合 (0.0〜1.0)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# このヘッダーに "1" が指定されたリクエストは必ずプロファイルする
+PROFILE_HEADER = "X-Profile"
+# プロファイルの出力先と、保持する最大ファイル数 (古いものから削除)
+PROFILE_DUMP_DIR = os.environ.get("PROFILE_DUMP_DIR", "/tmp/profiles")
+PROFILE_DUMP_MAX_FILES = int(os.environ.get("PROFILE_DUMP_MAX_FILES", "200"))
+
+# プロファイル対象のリクエスト中のみ、フェーズごとの所要時間 (ms) を記録する
+_phase_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("phase_timings", default=None)
+
+# スタックプロファイラは同時に1つしか動かせないため、実行中は他のリクエストのスタック取得を見送る
+_profiler_lock = threading.Lock()
+
+# pyinstrument の有無 (起動時間に影響しないよう、初めてプロファイルするときに確認する)
+_pyinstrument = None
+_pyinstrument_checked = False
+
+def _get_pyinstrument():
+    """pyinstrument がインストールされていればそのモジュールを、無ければ None を返す (cProfile で代用する)"""
+    global _pyinstrument, _pyinstrument_checked
+    if not _pyinstrument_checked:
+        try:
+            _pyinstrument = lazy_import("pyinstrument")
+        except ImportError:
+            _pyinstrument = None
+        _pyinstrument_checked = True
+    return _pyinstrument
+
+@contextmanager
+def phase(name: str):
+    """with ブロックの所要時間をフェーズとして記録する (プロファイル対象外のリクエストでは何もしない)"""
+    timings = _phase_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def should_profile(request: Request) -> bool:
+    if request.headers.get(PROFILE_HEADER) == "1":
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def _start_profiler():
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    try:
+        pyinstrument = _get_pyinstrument()
+        if pyinstrument is not None:
+            profiler = pyinstrument.Profiler(async_mode="enabled")
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+    except Exception:
+        _profiler_lock.release()
+        raise
+    return profiler
+
+def _stop_profiler(profiler, request: Request):
+    """プロファイラを停止し、結果をファイルに書き出す"""
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+    finally:
+        _profiler_lock.release()
+
+    os.makedirs(PROFILE_DUMP_DIR, exist_ok=True)
+    path_label = request.url.path.strip("/").replace("/", "_") or "root"
+    basename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.method}-{path_label}"
+    if isinstance(profiler, cProfile.Profile):
+        # snakeviz や flameprof でフレームグラフとして表示できる pstats 形式
+        profiler.dump_stats(os.path.join(PROFILE_DUMP_DIR, f"{basename}.prof"))
+    else:
+        with open(os.path.join(PROFILE_DUMP_DIR, f"{basename}.html"), "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+    _rotate_dumps()
+
+def _rotate_dumps():
+    """PROFILE_DUMP_MAX_FILES を超えた分を古いものから削除する"""
+    paths = [os.path.join(PROFILE_DUMP_DIR, name) for name in os.listdir(PROFILE_DUMP_DIR)]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - PROFILE_DUMP_MAX_FILES)]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to remove old profile dump ({path}): {e}")
+
+async def profile_request(request: Request, call_next):
+    """
+    対象リクエストについて、フェーズごとの所要時間を Server-Timing ヘッダーに付与し、
+    スタックプロファイルを PROFILE_DUMP_DIR に書き出すミドルウェア。
+    """
+    if not should_profile(request):
+        return await call_next(request)
+
+    timings: Dict[str, float] = {}
+    token = _phase_timings.set(timings)
+    profiler = None
+    try:
+        profiler = _start_profiler()
+    except Exception as e:
+        logger.warning(f"Failed to start profiler: {e}")
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        total = (time.perf_counter() - start) * 1000
+        _phase_timings.reset(token)
+        if profiler is not None:
+            try:
+                _stop_profiler(profiler, request)
+            except Exception as e:
+                logger.warning(f"Failed to write profile: {e}")
+
+    server_timing = [f"{name};dur={elapsed:.2f}" for name, elapsed in timings.items()]
+    server_timing.append(f"total;dur={total:.2f}")
+    response.headers["Server-Timing"] = ", ".join(server_timing)
+    return response
@@ -1,9 +1,12 @@
-from bs4 import BeautifulSoup
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timezone, timedelta
-from .config import REGIONS_DATA, get_prefecture_from_kishodai, LAST_MODIFIED_TIMES, HIGH_FREQUENCY_INTERVAL, LONG_FREQUENCY_INTERVAL, DOWNLOAD_LIMIT_THRESHOLD, DOWNLOAD_LIMIT
+from .config import REGIONS_DATA, get_prefecture_from_kishodai, get_base_feed_type, LAST_MODIFIED_TIMES, HIGH_FREQUENCY_INTERVAL, LONG_FREQUENCY_INTERVAL, DOWNLOAD_LIMIT_THRESHOLD, DOWNLOAD_LIMIT, STORAGE_BACKEND
 from .database import execute_sql
-import requests, feedparser, chardet
+from .memory_store import get_memory_store
+from .dedup import entry_fingerprint, update_chain_key
+# パーサー系 (bs4, feedparser, chardet) は import が重いため、コールドスタート短縮のため初回使用時に読み込む
+from .startup_profile import lazy_import
+import requests
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import logging
 
@@ -71,7 +74,7 @@ async def fetch_rss_feed(url: str, last_modified: Optional[datetime] = None) ->
 
         # エンコーディングが未設定の場合、chardetで判定する
         if response.encoding is None or response.encoding.lower() == "iso-8859-1":
-            detected = chardet.detect(response.content)
+            detected = lazy_import("chardet").detect(response.content)
             response.encoding = detected.get('encoding', 'utf-8')
             logger.info(f"Detected encoding: {response.encoding}")
 
@@ -119,7 +122,7 @@ async def parse_detail_xml(url:str) -> tuple[List[str],Optional[str]]:
 
     if response:
         try:
-            soup = BeautifulSoup(response.content, 'xml')
+            soup = lazy_import("bs4").BeautifulSoup(response.content, 'xml')
 
             # 都道府県情報を抽出 (XPath)
             prefecture_elements = soup.select('Report > Head > Area > Name')
@@ -146,7 +149,7 @@ async def parse_rss_feed(response: requests.Response) -> Tuple[List[Dict], Optio
     """
     try:
         # feedparser を使ってパース
-        feed = feedparser.parse(response.text)
+        feed = lazy_import("feedparser").parse(response.text)
 
         if feed.bozo:
             logger.warning(f"Feed parsing error: {feed.bozo_exception}")
@@ -197,7 +200,10 @@ async def parse_rss_feed(response: requests.Response) -> Tuple[List[Dict], Optio
 
 def should_throttle(url: str, interval: int) -> bool:
     """指定されたURLに対するリクエストをスロットリングすべきかどうかを判定する"""
-    last_fetched = execute_sql("SELECT last_fetched FROM feed_meta WHERE feed_url = %s", (url,), fetchone=True)
+    if STORAGE_BACKEND == "memory":
+        last_fetched = {'last_fetched': get_memory_store().get_last_fetched(url)}
+    else:
+        last_fetched = execute_sql("SELECT last_fetched FROM feed_meta WHERE feed_url = %s", (url,), fetchone=True)
 
     if last_fetched and last_fetched['last_fetched']:
         time_since_last_fetch = datetime.now(timezone.utc) - last_fetched['last_fetched']
@@ -205,17 +211,21 @@ def should_throttle(url: str, interval: int) -> bool:
     else:
         return False  # 初回取得時はスロットリングしない
 
-def get_filtered_entries_from_db(feed_url: str, region: Optional[str] = None, prefecture: Optional[str] = None) -> List[Dict]:
-    """DBから指定条件でエントリをフィルタリング(feed_url使用)"""
+def get_filtered_entries_from_db(feed_type: str, region: Optional[str] = None, prefecture: Optional[str] = None) -> List[Dict]:
+    """読み取りモデルから指定条件でエントリをフィルタリング(高頻度・長期フィードをまとめた feed_type 使用)"""
 
-    # feed_metaテーブルからfeed_idを取得
-    feed_meta = execute_sql("SELECT id FROM feed_meta WHERE feed_url = %s", (feed_url,), fetchone=True)
-    if not feed_meta:
-        return []  # 該当するフィードがない場合は空のリストを返す
-    feed_id = feed_meta['id']
+    if STORAGE_BACKEND == "memory":
+        # DB と同じく region と prefecture の両方を満たすエントリに絞り込む
+        prefectures = REGIONS_DATA.get(region, {}).get("prefectures", []) if region else None
+        if prefecture:
+            prefectures = [prefecture] if prefectures is None or prefecture in prefectures else []
+        return get_memory_store().get_filtered_entries(feed_type, prefectures, limit=10)
 
-    query = "SELECT * FROM feed_entries WHERE feed_id = %s"
-    params = [feed_id]
+    query = """
+        SELECT entry_title, entry_updated, publishing_office, entry_link, entry_content, prefecture
+        FROM feed_entries_read WHERE feed_type = %s
+    """
+    params = [feed_type]
 
     if region:
         prefectures_in_region =  REGIONS_DATA.get(region, {}).get("prefectures", [])
@@ -231,9 +241,47 @@ def get_filtered_entries_from_db(feed_url: str, region: Optional[str] = None, pr
         params.append(prefecture)
 
     query += " ORDER BY entry_updated DESC LIMIT 10"
-    filtered_entries = execute_sql(query, tuple(params), fetchall=True)
+    filtered_entries = execute_sql(query, tuple(params), fetchall=True, readonly=True)
     return filtered_entries
 
+def collapse_update_chains(chain_keys: List[str]) -> List[int]:
+    """
+    同じ chain_key を持つエントリのうち最新版以外を、最新版に置き換えられたものとして紐付ける。
+    新たに置き換えられたエントリの id を返す。
+    """
+    if not chain_keys:
+        return []
+    superseded = execute_sql("""
+        WITH latest AS (
+            SELECT DISTINCT ON (chain_key) chain_key, id
+            FROM feed_entries
+            WHERE chain_key = ANY(%s)
+            ORDER BY chain_key, entry_updated DESC NULLS LAST, id DESC
+        )
+        UPDATE feed_entries e
+        SET superseded_by = latest.id
+        FROM latest
+        WHERE e.chain_key = latest.chain_key
+          AND e.id <> latest.id
+          AND e.superseded_by IS DISTINCT FROM latest.id
+        RETURNING e.id
+    """, (chain_keys,), fetchall=True)
+    return [row['id'] for row in superseded]
+
+def refresh_read_model(feed_type: str, entry_ids: List[int], superseded_ids: Optional[List[int]] = None):
+    """新たに挿入されたエントリのうち最新版だけを読み取りモデル (feed_entries_read) に反映し、置き換えられた版を取り除く"""
+    if superseded_ids:
+        execute_sql("DELETE FROM feed_entries_read WHERE source_id = ANY(%s)", (superseded_ids,))
+    if not entry_ids:
+        return
+    execute_sql("""
+        INSERT INTO feed_entries_read (source_id, feed_type, prefecture, entry_title, entry_updated, publishing_office, entry_link, entry_content, search_text)
+        SELECT id, %s, prefecture, entry_title, entry_updated, publishing_office, entry_link, entry_content,
+               lower(normalize(COALESCE(entry_title, '') || E'\\n' || COALESCE(entry_content, ''), NFKC))
+        FROM feed_entries WHERE id = ANY(%s) AND superseded_by IS NULL
+        ON CONFLICT (source_id) DO NOTHING
+    """, (get_base_feed_type(feed_type), entry_ids))
+
 async def insert_or_update_feed_data(parsed_feed_data: Tuple[List[Dict], Optional[str], Optional[str], Optional[str], Optional[str],Optional[str]], feed_type: str, url: str, category: str, frequency_type: str):
     """パースされたフィードデータとその他の情報を受け取り、DBに挿入/更新する"""
     entries, feed_title, feed_subtitle, feed_updated, feed_id_in_atom, rights = parsed_feed_data
@@ -242,22 +290,31 @@ async def insert_or_update_feed_data(parsed_feed_data: Tuple[List[Dict], Optiona
     # 1. feed_meta テーブルへの挿入/更新 (INSERT ... ON CONFLICT)
     feed_updated_dt = datetime.strptime(feed_updated, '%Y-%m-%dT%H:%M:%S%z') if feed_updated else None
 
-    feed_id = execute_sql("""
-        INSERT INTO feed_meta (feed_url, feed_title, feed_subtitle, feed_updated, feed_id_in_atom, rights, category, frequency_type, last_fetched)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (feed_url) DO UPDATE
-        SET feed_title = EXCLUDED.feed_title,
-            feed_subtitle = EXCLUDED.feed_subtitle,
-            feed_updated = EXCLUDED.feed_updated,
-            feed_id_in_atom = EXCLUDED.feed_id_in_atom,
-            rights = EXCLUDED.rights,
-            category = EXCLUDED.category,
-            frequency_type = EXCLUDED.frequency_type,
-            last_fetched = EXCLUDED.last_fetched
-        RETURNING id
-    """, (url, feed_title, feed_subtitle, feed_updated_dt, feed_id_in_atom, rights, category, frequency_type, datetime.now(timezone.utc)), fetchone=True)['id']
+    if STORAGE_BACKEND == "memory":
+        feed_id = get_memory_store().upsert_feed_meta(
+            url, feed_title=feed_title, feed_subtitle=feed_subtitle, feed_updated=feed_updated_dt, feed_id_in_atom=feed_id_in_atom,
+            rights=rights, category=category, frequency_type=frequency_type, last_fetched=datetime.now(timezone.utc))
+    else:
+        feed_id = execute_sql("""
+            INSERT INTO feed_meta (feed_url, feed_title, feed_subtitle, feed_updated, feed_id_in_atom, rights, category, frequency_type, last_fetched)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (feed_url) DO UPDATE
+            SET feed_title = EXCLUDED.feed_title,
+                feed_subtitle = EXCLUDED.feed_subtitle,
+                feed_updated = EXCLUDED.feed_updated,
+                feed_id_in_atom = EXCLUDED.feed_id_in_atom,
+                rights = EXCLUDED.rights,
+                category = EXCLUDED.category,
+                frequency_type = EXCLUDED.frequency_type,
+                last_fetched = EXCLUDED.last_fetched
+            RETURNING id
+        """, (url, feed_title, feed_subtitle, feed_updated_dt, feed_id_in_atom, rights, category, frequency_type, datetime.now(timezone.utc)), fetchone=True)['id']
 
     # 2. feed_entries テーブルへの挿入 (都道府県ごとに分割)
+    # 高頻度・長期フィードに重複して載った報や内容の変わらない再発表は、表示対象の行との指紋の一意制約により挿入しない
+    base_feed_type = get_base_feed_type(feed_type)
+    inserted_ids = []
+    chain_keys = set()
     for entry in entries:
         try:
             entry_updated_dt = datetime.strptime(entry['updated'], '%Y-%m-%dT%H:%M:%S%z') if entry['updated'] else None
@@ -270,11 +327,30 @@ async def insert_or_update_feed_data(parsed_feed_data: Tuple[List[Dict], Optiona
 
         # 都道府県ごとにレコードを挿入
         for prefecture_item in entry['prefectures']:
-            execute_sql("""
-                INSERT INTO feed_entries (feed_id, entry_id_in_atom, entry_title, entry_updated, publishing_office, entry_link, entry_content, prefecture)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (feed_id, entry_id_in_atom, publishing_office) DO NOTHING
-            """, (feed_id, entry['id'], entry['title'], entry_updated_dt, entry['publishing_office'], entry['link'], entry['content'], prefecture_item))
+            fingerprint = entry_fingerprint(entry['title'], entry['publishing_office'], prefecture_item, entry['content'])
+            chain_key = update_chain_key(base_feed_type, entry['title'], entry['publishing_office'], prefecture_item)
+            if STORAGE_BACKEND == "memory":
+                # メモリストアでは索引自体が読み取りモデルを兼ねる
+                get_memory_store().insert_entry(feed_id, base_feed_type, entry['id'], entry['title'], entry_updated_dt,
+                                                entry['publishing_office'], entry['link'], entry['content'], prefecture_item,
+                                                fingerprint, chain_key)
+                continue
+            inserted = execute_sql("""
+                INSERT INTO feed_entries (feed_id, entry_id_in_atom, entry_title, entry_updated, publishing_office, entry_link, entry_content, prefecture,
+                                          feed_type, fingerprint, chain_key)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """, (feed_id, entry['id'], entry['title'], entry_updated_dt, entry['publishing_office'], entry['link'], entry['content'], prefecture_item,
+                  base_feed_type, fingerprint, chain_key), fetchone=True)
+            if inserted:
+                inserted_ids.append(inserted['id'])
+                if chain_key:
+                    chain_keys.add(chain_key)
+
+    # 3. 更新の紐付けと読み取りモデルへの差分反映 (最新版のみ表示対象とする)
+    superseded_ids = collapse_update_chains(list(chain_keys))
+    refresh_read_model(feed_type, inserted_ids, superseded_ids)
 
     return feed_id
 
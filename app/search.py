@@ -0,0 +1,101 @@
+import base64, json, logging, unicodedata
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from .config import REGIONS_DATA, STORAGE_BACKEND
+from .database import execute_sql
+from .memory_store import get_memory_store
+
+# ルートロガーの設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 1回の検索で返す最大件数
+MAX_SEARCH_LIMIT = 50
+
+def normalize_search_text(text: Optional[str]) -> str:
+    """全角・半角の揺れを吸収するため NFKC 正規化して小文字化する (DB 側の search_text と同じ規則)"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+def query_ngrams(normalized_query: str) -> List[str]:
+    """検索語を db.sql の search_ngrams と同じ単位に分割する (2文字以上は 2-gram、1文字は 1-gram)"""
+    n = 2 if len(normalized_query) >= 2 else 1
+    return sorted({normalized_query[i:i + n] for i in range(len(normalized_query) - n + 1)})
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def encode_cursor(rank: int, entry_updated: Optional[datetime], source_id: int) -> str:
+    """最後に返したエントリの (順位, 更新日時, id) を次ページ用のカーソル文字列にする"""
+    payload = [rank, entry_updated.isoformat() if entry_updated else None, source_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[int, Optional[datetime], int]:
+    rank, entry_updated, source_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return int(rank), datetime.fromisoformat(entry_updated) if entry_updated else None, int(source_id)
+
+def search_entries(query: str, feed_type: Optional[str] = None, region: Optional[str] = None, prefecture: Optional[str] = None,
+                   cursor: Optional[str] = None, limit: int = 10) -> Tuple[List[Dict], Optional[str]]:
+    """
+    タイトル・本文にキーワードを含むエントリを検索し、(エントリ一覧, 次ページのカーソル) を返す。
+    タイトルに含むものを優先し、同順位は新しい順に並べる。
+    """
+    normalized_query = normalize_search_text(query).strip()
+    if not normalized_query:
+        return [], None
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    after = decode_cursor(cursor) if cursor else None
+
+    # region と prefecture の両方を満たす都道府県に絞り込む (None は絞り込みなし)
+    prefectures = REGIONS_DATA.get(region, {}).get("prefectures", []) if region else None
+    if prefecture:
+        prefectures = [prefecture] if prefectures is None or prefecture in prefectures else []
+    if prefectures == []:
+        return [], None
+
+    if STORAGE_BACKEND == "memory":
+        rows = get_memory_store().search(normalized_query, feed_type, prefectures, after, limit)
+    else:
+        rows = _search_db(normalized_query, feed_type, prefectures, after, limit)
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(last["rank"], last["entry_updated"], last["source_id"])
+    return rows, next_cursor
+
+def _search_db(normalized_query: str, feed_type: Optional[str], prefectures: Optional[List[str]],
+               after: Optional[Tuple[int, Optional[datetime], int]], limit: int) -> List[Dict]:
+    # GIN 索引 (search_ngrams) で候補を絞り、LIKE で実際に含むものだけを残す
+    pattern = f"%{_escape_like(normalized_query)}%"
+    conditions = ["search_ngrams(search_text) @> %s::text[]", "search_text LIKE %s"]
+    params: list = [query_ngrams(normalized_query), pattern]
+    if feed_type:
+        conditions.append("feed_type = %s")
+        params.append(feed_type)
+    if prefectures is not None:
+        conditions.append("prefecture = ANY(%s)")
+        params.append(prefectures)
+
+    query = f"""
+        SELECT * FROM (
+            SELECT source_id, feed_type, prefecture, entry_title, entry_updated, publishing_office, entry_link, entry_content,
+                   CASE WHEN lower(normalize(COALESCE(entry_title, ''), NFKC)) LIKE %s THEN 2 ELSE 1 END AS rank,
+                   COALESCE(entry_updated, '-infinity') AS sort_updated
+            FROM feed_entries_read
+            WHERE {" AND ".join(conditions)}
+        ) AS hits
+    """
+    params.insert(0, pattern)
+
+    # キーセットページネーション: 前ページ最後の (順位, 更新日時, id) より後ろだけを取得する
+    if after:
+        rank, entry_updated, source_id = after
+        query += " WHERE (rank, sort_updated, source_id) < (%s, COALESCE(%s::timestamptz, '-infinity'), %s)"
+        params.extend([rank, entry_updated, source_id])
+
+    query += " ORDER BY rank DESC, sort_updated DESC, source_id DESC LIMIT %s"
+    params.append(limit)
+    rows = execute_sql(query, tuple(params), fetchall=True, readonly=True)
+    for row in rows:
+        row.pop("sort_updated", None)
+    return rows
@@ -0,0 +1,54 @@
+import builtins, importlib, logging, os, sys, time
+from typing import Dict, Optional
+
+# ルートロガーの設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# このモジュールは app.main の最初に読み込まれるため、ここをプロセス起動時刻の基準とする
+PROCESS_START = time.perf_counter()
+
+# STARTUP_PROFILE=1 の場合、モジュールごとの import 時間 (依存モジュール込みの累積) を記録する
+STARTUP_PROFILE_ENABLED = os.environ.get("STARTUP_PROFILE", "0") == "1"
+
+import_times: Dict[str, float] = {}
+milestones: Dict[str, float] = {}
+
+_original_import = builtins.__import__
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # 相対 import と読み込み済みモジュールは計測しない
+    if level != 0 or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        import_times.setdefault(name, (time.perf_counter() - start) * 1000)
+
+if STARTUP_PROFILE_ENABLED:
+    builtins.__import__ = _timed_import
+
+def lazy_import(name: str):
+    """初回使用時にモジュールを読み込む。初回の読み込み時間は import_times に記録する"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times.setdefault(name, (time.perf_counter() - start) * 1000)
+    logger.info(f"Lazily imported {name} in {import_times[name]:.1f} ms")
+    return module
+
+def mark(name: str):
+    """起動からの経過時間 (ms) を節目として記録する (最初の1回のみ)"""
+    if name not in milestones:
+        milestones[name] = (time.perf_counter() - PROCESS_START) * 1000
+
+def get_startup_profile(top: Optional[int] = 20) -> Dict:
+    """節目の経過時間と、import 時間の長い順のモジュール一覧を返す"""
+    slowest = sorted(import_times.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "milestones_ms": {name: round(elapsed, 1) for name, elapsed in milestones.items()},
+        "import_times_ms": {name: round(elapsed, 1) for name, elapsed in slowest[:top]},
+    }
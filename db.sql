@@ -1,3 +1,4 @@
+DROP TABLE IF EXISTS feed_entries_read;
 DROP TABLE IF EXISTS feed_entries;
 DROP TABLE IF EXISTS feed_meta;
 
@@ -25,5 +26,46 @@ CREATE TABLE IF NOT EXISTS feed_entries (
     entry_content TEXT,
     prefecture TEXT,
     inserted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    -- 重複排除用: 高頻度・長期フィードをまとめた種別、指紋 (タイトル・発表官署・地域・本文のハッシュ)、更新をまとめるキー
+    feed_type TEXT,
+    fingerprint TEXT,
+    chain_key TEXT,
+    -- 同じ報のより新しい版に置き換えられた場合、その版の id
+    superseded_by INTEGER REFERENCES feed_entries(id) ON DELETE SET NULL,
     UNIQUE (feed_id, entry_id_in_atom, publishing_office)
 );
+
+-- 指紋の重複は表示対象 (置き換えられていない) の行とだけ判定する
+-- (発表→解除→再発表のように、過去の版と同じ内容の報が再び最新になる場合があるため)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_feed_entries_current_fingerprint ON feed_entries (feed_type, fingerprint) WHERE superseded_by IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_feed_entries_chain_key ON feed_entries (chain_key) WHERE chain_key IS NOT NULL;
+
+-- 全文検索用: 文字単位の 1-gram と 2-gram の配列を返す
+-- 日本語は単語境界が無く、「大雨」「津波」のような2文字語も多いため、pg_trgm ではなく 2-gram で索引化する
+CREATE OR REPLACE FUNCTION search_ngrams(t TEXT) RETURNS TEXT[] AS $$
+    SELECT ARRAY(
+        SELECT DISTINCT substr(t, i, n)
+        FROM generate_series(1, char_length(t)) AS i, (VALUES (1), (2)) AS v(n)
+        WHERE i + n - 1 <= char_length(t)
+    )
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Web 層向けの読み取りモデル (feed_type・都道府県ごとに表示用の列だけを非正規化して保持)
+-- feed_type は高頻度・長期フィードをまとめた種別 (extra, eqvol, other)
+CREATE TABLE IF NOT EXISTS feed_entries_read (
+    source_id INTEGER PRIMARY KEY REFERENCES feed_entries(id) ON DELETE CASCADE,
+    feed_type TEXT NOT NULL,
+    prefecture TEXT,
+    entry_title TEXT,
+    entry_updated TIMESTAMP WITH TIME ZONE,
+    publishing_office TEXT,
+    entry_link TEXT,
+    entry_content TEXT,
+    -- 検索対象テキスト (タイトルと本文を NFKC 正規化・小文字化したもの)。取り込み時に設定する
+    search_text TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_feed_entries_read_type_pref_updated ON feed_entries_read (feed_type, prefecture, entry_updated DESC);
+CREATE INDEX IF NOT EXISTS idx_feed_entries_read_type_updated ON feed_entries_read (feed_type, entry_updated DESC);
+CREATE INDEX IF NOT EXISTS idx_feed_entries_read_search ON feed_entries_read USING GIN (search_ngrams(search_text));